@@ -7,8 +7,10 @@
 """Generate Docstring."""
 
 # Standard library imports
+import copy
 import re
 from collections import OrderedDict
+from functools import lru_cache
 
 # Third party imports
 from qtpy.QtGui import QTextCursor
@@ -20,17 +22,18 @@ from spyder.config.manager import CONF
 from spyder.py3compat import to_text_string
 
 
+FUNCTION_START_RE = re.compile(r'(async\s+)?def\s')
+QUOTE_RE = re.compile(r"""(?<!\\)['"]""")
+NEWLINE_TABLE = str.maketrans('', '', '\r\n')
+DOCSTRING_TRIGGERS = frozenset(('"""', 'r"""', "'''", "r'''"))
+
+
 def is_start_of_function(text):
     """Return True if text is the beginning of the function definition."""
-    if isinstance(text, str) or isinstance(text, unicode):
-        function_prefix = ['def', 'async def']
-        text = text.lstrip()
-
-        for prefix in function_prefix:
-            if text.startswith(prefix):
-                return True
+    if not isinstance(text, str):
+        return False
 
-    return False
+    return FUNCTION_START_RE.match(text.lstrip()) is not None
 
 
 def get_indent(text):
@@ -48,6 +51,17 @@ def get_indent(text):
     return indent
 
 
+@lru_cache(maxsize=128)
+def parse_function_definition(text):
+    """Return a FunctionInfo instance with the parsed function definition.
+
+    Results are cached by definition text, so the returned instance is
+    shared. Its parsed arguments are stored in a tuple and parse_body must
+    only be called on a copy of it.
+    """
+    return FunctionInfo.from_text(text)
+
+
 class DocstringWriterExtension(object):
     """Class for insert docstring template automatically."""
 
@@ -61,11 +75,10 @@ class DocstringWriterExtension(object):
     @staticmethod
     def is_beginning_triple_quotes(text):
         """Return True if there are only triple quotes in text."""
-        docstring_triggers = ['"""', 'r"""', "'''", "r'''"]
-        if text.lstrip() in docstring_triggers:
-            return True
+        if not text.endswith(('"""', "'''")):
+            return False
 
-        return False
+        return text.lstrip() in DOCSTRING_TRIGGERS
 
     def get_function_definition_from_first_line(self):
         """Get func def when the cursor is located on the first def line."""
@@ -98,10 +111,10 @@ class DocstringWriterExtension(object):
                     return None
                 if is_start_of_function(cur_text):
                     return None
-                if cur_text.strip == '':
+                if cur_text.strip() == '':
                     return None
 
-            if cur_text[-1] == '\\':
+            if cur_text.endswith('\\'):
                 cur_text = cur_text[:-1]
 
             func_text += cur_text
@@ -117,33 +130,46 @@ class DocstringWriterExtension(object):
     def get_function_definition_from_below_last_line(self):
         """Get func def when the cursor is located below the last def line."""
         cursor = self.code_editor.textCursor()
-        func_text = ''
-        is_first_line = True
         line_number = cursor.blockNumber() + 1
-        number_of_lines_of_function = 0
 
-        for idx in range(min(line_number, 20)):
-            if cursor.block().blockNumber() == 0:
+        if line_number == 1:
+            return None
+
+        # Bind to locals since they are used for every block visited
+        block = cursor.block
+        move_position = cursor.movePosition
+        previous_block = QTextCursor.PreviousBlock
+
+        move_position(previous_block)
+        last_text = block().text().rstrip()
+
+        if not last_text.endswith(':'):
+            return None
+
+        # Most definitions fit in a single line
+        if is_start_of_function(last_text):
+            return last_text, 1
+
+        # Lines are collected from the last one up and joined once at the end
+        func_lines = [last_text]
+
+        for idx in range(min(line_number, 20) - 1):
+            if block().blockNumber() == 0:
                 return None
 
-            cursor.movePosition(QTextCursor.PreviousBlock)
-            prev_text = to_text_string(cursor.block().text()).rstrip()
+            move_position(previous_block)
+            prev_text = block().text().rstrip()
 
-            if is_first_line:
-                if not prev_text.endswith(':'):
-                    return None
-                is_first_line = False
-            elif prev_text.endswith(':') or prev_text == '':
+            if prev_text.endswith(':') or prev_text == '':
                 return None
 
-            if prev_text[-1] == '\\':
+            if prev_text.endswith('\\'):
                 prev_text = prev_text[:-1]
 
-            func_text = prev_text + func_text
+            func_lines.append(prev_text)
 
-            number_of_lines_of_function += 1
             if is_start_of_function(prev_text):
-                return func_text, number_of_lines_of_function
+                return ''.join(reversed(func_lines)), len(func_lines)
 
         return None
 
@@ -250,8 +276,8 @@ class DocstringWriterExtension(object):
 
         if result:
             func_def, __ = result
-            func_info = FunctionInfo()
-            func_info.parse_def(func_def)
+            # Cached instances are shared, so set the body results on a copy
+            func_info = copy.copy(parse_function_definition(func_def))
 
             if func_info.has_info:
                 func_body = self.get_function_body(func_info.func_indent)
@@ -267,67 +293,51 @@ class DocstringWriterExtension(object):
 
     def _generate_numpy_doc(self, func_info):
         """Generate a docstring of numpy type."""
-        numpy_doc = ''
-
-        arg_names = func_info.arg_name_list
-        arg_types = func_info.arg_type_list
-        arg_values = func_info.arg_value_list
+        args = func_info.args
 
-        if len(arg_names) > 0 and arg_names[0] == 'self':
-            del arg_names[0]
-            del arg_types[0]
-            del arg_values[0]
+        if len(args) > 0 and args[0][0] == 'self':
+            args = args[1:]
 
-        indent1 = func_info.func_indent + self.code_editor.indent_chars
-        indent2 = func_info.func_indent + self.code_editor.indent_chars * 2
+        indent_chars = self.code_editor.indent_chars
+        indent1 = func_info.func_indent + indent_chars
+        indent2 = indent1 + indent_chars
 
-        numpy_doc += '\n{}\n'.format(indent1)
+        numpy_doc = [f'\n{indent1}\n']
 
-        if len(arg_names) > 0:
-            numpy_doc += '\n{}Parameters'.format(indent1)
-            numpy_doc += '\n{}----------\n'.format(indent1)
+        if len(args) > 0:
+            numpy_doc.append(f'\n{indent1}Parameters\n{indent1}----------\n')
 
-        arg_text = ''
-        for arg_name, arg_type, arg_value in zip(arg_names, arg_types,
-                                                 arg_values):
-            arg_text += '{}{} : '.format(indent1, arg_name)
-            if arg_type:
-                arg_text += '{}'.format(arg_type)
-            else:
-                arg_text += 'TYPE'
+        for arg_name, arg_type, arg_value in args:
+            numpy_doc.append(f'{indent1}{arg_name} : {arg_type or "TYPE"}')
 
             if arg_value:
-                arg_text += ', optional'
+                numpy_doc.append(', optional')
 
-            arg_text += '\n{}DESCRIPTION.'.format(indent2)
+            numpy_doc.append(f'\n{indent2}DESCRIPTION.')
 
             if arg_value:
                 arg_value = arg_value.replace(self.quote3, self.quote3_other)
-                arg_text += ' The default is {}.'.format(arg_value)
+                numpy_doc.append(f' The default is {arg_value}.')
 
-            arg_text += '\n'
-
-        numpy_doc += arg_text
+            numpy_doc.append('\n')
 
         if func_info.raise_list:
-            numpy_doc += '\n{}Raises'.format(indent1)
-            numpy_doc += '\n{}------'.format(indent1)
+            numpy_doc.append(f'\n{indent1}Raises\n{indent1}------')
             for raise_type in func_info.raise_list:
-                numpy_doc += '\n{}{}'.format(indent1, raise_type)
-                numpy_doc += '\n{}DESCRIPTION.'.format(indent2)
-            numpy_doc += '\n'
+                numpy_doc.append(
+                    f'\n{indent1}{raise_type}\n{indent2}DESCRIPTION.')
+            numpy_doc.append('\n')
 
-        numpy_doc += '\n'
+        numpy_doc.append('\n')
         if func_info.has_yield:
-            header = '{0}Yields\n{0}------\n'.format(indent1)
+            header = f'{indent1}Yields\n{indent1}------\n'
         else:
-            header = '{0}Returns\n{0}-------\n'.format(indent1)
+            header = f'{indent1}Returns\n{indent1}-------\n'
 
         return_type_annotated = func_info.return_type_annotated
         if return_type_annotated:
-            return_section = '{}{}{}'.format(header, indent1,
-                                             return_type_annotated)
-            return_section += '\n{}DESCRIPTION.'.format(indent2)
+            return_section = (f'{header}{indent1}{return_type_annotated}'
+                              f'\n{indent2}DESCRIPTION.')
         else:
             return_element_type = indent1 + '{return_type}\n' + indent2 + \
                 'DESCRIPTION.'
@@ -341,76 +351,58 @@ class DocstringWriterExtension(object):
                     return_element_name, return_element_type, placeholder,
                     indent1)
             except (ValueError, IndexError):
-                return_section = '{}{}None.'.format(header, indent1)
+                return_section = f'{header}{indent1}None.'
 
-        numpy_doc += return_section
-        numpy_doc += '\n\n{}{}'.format(indent1, self.quote3)
+        numpy_doc.append(return_section)
+        numpy_doc.append(f'\n\n{indent1}{self.quote3}')
 
-        return numpy_doc
+        return ''.join(numpy_doc)
 
     def _generate_google_doc(self, func_info):
         """Generate a docstring of google type."""
-        google_doc = ''
-
-        arg_names = func_info.arg_name_list
-        arg_types = func_info.arg_type_list
-        arg_values = func_info.arg_value_list
+        args = func_info.args
 
-        if len(arg_names) > 0 and arg_names[0] == 'self':
-            del arg_names[0]
-            del arg_types[0]
-            del arg_values[0]
+        if len(args) > 0 and args[0][0] == 'self':
+            args = args[1:]
 
-        indent1 = func_info.func_indent + self.code_editor.indent_chars
-        indent2 = func_info.func_indent + self.code_editor.indent_chars * 2
+        indent_chars = self.code_editor.indent_chars
+        indent1 = func_info.func_indent + indent_chars
+        indent2 = indent1 + indent_chars
 
-        google_doc += '\n{}\n'.format(indent1)
+        google_doc = [f'\n{indent1}\n']
 
-        if len(arg_names) > 0:
-            google_doc += '\n{0}Args:\n'.format(indent1)
+        if len(args) > 0:
+            google_doc.append(f'\n{indent1}Args:\n')
 
-        arg_text = ''
-        for arg_name, arg_type, arg_value in zip(arg_names, arg_types,
-                                                 arg_values):
-            arg_text += '{}{} '.format(indent2, arg_name)
-
-            arg_text += '('
-            if arg_type:
-                arg_text += '{}'.format(arg_type)
-            else:
-                arg_text += 'TYPE'
+        for arg_name, arg_type, arg_value in args:
+            google_doc.append(f'{indent2}{arg_name} ({arg_type or "TYPE"}')
 
             if arg_value:
-                arg_text += ', optional'
-            arg_text += '):'
-
-            arg_text += ' DESCRIPTION.'
+                google_doc.append(', optional')
+            google_doc.append('): DESCRIPTION.')
 
             if arg_value:
                 arg_value = arg_value.replace(self.quote3, self.quote3_other)
-                arg_text += ' Defaults to {}.\n'.format(arg_value)
+                google_doc.append(f' Defaults to {arg_value}.\n')
             else:
-                arg_text += '\n'
-
-        google_doc += arg_text
+                google_doc.append('\n')
 
         if func_info.raise_list:
-            google_doc += '\n{0}Raises:'.format(indent1)
+            google_doc.append(f'\n{indent1}Raises:')
             for raise_type in func_info.raise_list:
-                google_doc += '\n{}{}'.format(indent2, raise_type)
-                google_doc += ': DESCRIPTION.'
-            google_doc += '\n'
+                google_doc.append(f'\n{indent2}{raise_type}: DESCRIPTION.')
+            google_doc.append('\n')
 
-        google_doc += '\n'
+        google_doc.append('\n')
         if func_info.has_yield:
-            header = '{}Yields:\n'.format(indent1)
+            header = f'{indent1}Yields:\n'
         else:
-            header = '{}Returns:\n'.format(indent1)
+            header = f'{indent1}Returns:\n'
 
         return_type_annotated = func_info.return_type_annotated
         if return_type_annotated:
-            return_section = '{}{}{}: DESCRIPTION.'.format(
-                header, indent2, return_type_annotated)
+            return_section = (f'{header}{indent2}{return_type_annotated}'
+                              ': DESCRIPTION.')
         else:
             return_element_type = indent2 + '{return_type}: DESCRIPTION.'
             placeholder = return_element_type.format(return_type='TYPE')
@@ -423,12 +415,12 @@ class DocstringWriterExtension(object):
                     return_element_name, return_element_type, placeholder,
                     indent2)
             except (ValueError, IndexError):
-                return_section = '{}{}None.'.format(header, indent2)
+                return_section = f'{header}{indent2}None.'
 
-        google_doc += return_section
-        google_doc += '\n\n{}{}'.format(indent1, self.quote3)
+        google_doc.append(return_section)
+        google_doc.append(f'\n\n{indent1}{self.quote3}')
 
-        return google_doc
+        return ''.join(google_doc)
 
     @staticmethod
     def find_top_level_bracket_locations(string_toparse):
@@ -598,61 +590,80 @@ class FunctionInfo(object):
         self.func_text = ''
         self.args_text = ''
         self.func_indent = ''
-        self.arg_name_list = []
-        self.arg_type_list = []
-        self.arg_value_list = []
+        self.args = ()
         self.return_type_annotated = None
         self.return_value_in_body = []
         self.raise_list = None
         self.has_yield = False
 
-    @staticmethod
-    def is_char_in_pairs(pos_char, pairs):
-        """Return True if the charactor is in pairs of brackets or quotes."""
-        for pos_left, pos_right in pairs.items():
-            if pos_left < pos_char < pos_right:
-                return True
+    @property
+    def arg_name_list(self):
+        """Return the list of argument names."""
+        return [arg_name for arg_name, __, __ in self.args]
 
-        return False
+    @property
+    def arg_type_list(self):
+        """Return the list of argument type annotations."""
+        return [arg_type for __, arg_type, __ in self.args]
+
+    @property
+    def arg_value_list(self):
+        """Return the list of argument default values."""
+        return [arg_value for __, __, arg_value in self.args]
 
     @staticmethod
     def _find_quote_position(text):
         """Return the start and end position of pairs of quotes."""
-        pos = {}
-        is_found_left_quote = False
+        if "'" not in text and '"' not in text:
+            return {}
 
-        for idx, character in enumerate(text):
-            if is_found_left_quote is False:
-                if character == "'" or character == '"':
-                    is_found_left_quote = True
-                    quote = character
-                    left_pos = idx
-            else:
-                if character == quote and text[idx - 1] != '\\':
-                    pos[left_pos] = idx
-                    is_found_left_quote = False
-
-        if is_found_left_quote:
+        pos = {}
+        quote = None
+
+        for match in QUOTE_RE.finditer(text):
+            character = match.group()
+            if quote is None:
+                quote = character
+                left_pos = match.start()
+            elif character == quote:
+                pos[left_pos] = match.start()
+                quote = None
+
+        if quote is not None:
             raise IndexError("No matching close quote at: " + str(left_pos))
 
         return pos
 
+    @staticmethod
+    def _get_quote_mask(text, pos_quote):
+        """Return a mask with 1 for every character enclosed in quotes."""
+        quote_mask = bytearray(len(text))
+        for pos_left, pos_right in pos_quote.items():
+            quote_mask[pos_left + 1:pos_right] = (
+                b'\x01' * (pos_right - pos_left - 1))
+
+        return quote_mask
+
     def _find_bracket_position(self, text, bracket_left, bracket_right,
-                               pos_quote):
+                               quote_mask):
         """Return the start and end position of pairs of brackets.
 
+        quote_mask is the result of _get_quote_mask for text, so brackets
+        enclosed in quotes are ignored.
+
         https://stackoverflow.com/questions/29991917/
         indices-of-matching-parentheses-in-python
         """
+        if bracket_left not in text and bracket_right not in text:
+            return {}
+
         pos = {}
         pstack = []
 
         for idx, character in enumerate(text):
-            if character == bracket_left and \
-                    not self.is_char_in_pairs(idx, pos_quote):
+            if character == bracket_left and not quote_mask[idx]:
                 pstack.append(idx)
-            elif character == bracket_right and \
-                    not self.is_char_in_pairs(idx, pos_quote):
+            elif character == bracket_right and not quote_mask[idx]:
                 if len(pstack) == 0:
                     raise IndexError(
                         "No matching closing parens at: " + str(idx))
@@ -664,43 +675,54 @@ class FunctionInfo(object):
 
         return pos
 
+    def _find_return_arrow_position(self, text):
+        """Return the position of the return annotation arrow or -1.
+
+        The text is scanned backwards from the final colon, so the first
+        arrow found outside of brackets and quotes is the one of the return
+        annotation.
+        """
+        if not text.endswith(':') or '->' not in text:
+            return -1
+
+        try:
+            pos_quote = self._find_quote_position(text)
+        except IndexError:
+            return -1
+        quote_mask = self._get_quote_mask(text, pos_quote)
+
+        depth = 0
+        for idx in range(len(text) - 2, 0, -1):
+            if quote_mask[idx]:
+                continue
+
+            character = text[idx]
+            if character in ')]}':
+                depth += 1
+            elif character in '([{':
+                depth -= 1
+            elif (character == '>' and text[idx - 1] == '-'
+                    and depth == 0):
+                return idx - 1
+
+        return -1
+
     def split_arg_to_name_type_value(self, args_list):
         """Split argument text to name, type, value."""
+        args = []
         for arg in args_list:
-            arg_type = None
-            arg_value = None
-
-            has_type = False
-            has_value = False
-
-            pos_colon = arg.find(':')
-            pos_equal = arg.find('=')
-
-            if pos_equal > -1:
-                has_value = True
-
-            if pos_colon > -1:
-                if not has_value:
-                    has_type = True
-                elif pos_equal > pos_colon:  # exception for def foo(arg1=":")
-                    has_type = True
-
-            if has_value and has_type:
-                arg_name = arg[0:pos_colon].strip()
-                arg_type = arg[pos_colon + 1:pos_equal].strip()
-                arg_value = arg[pos_equal + 1:].strip()
-            elif not has_value and has_type:
-                arg_name = arg[0:pos_colon].strip()
-                arg_type = arg[pos_colon + 1:].strip()
-            elif has_value and not has_type:
-                arg_name = arg[0:pos_equal].strip()
-                arg_value = arg[pos_equal + 1:].strip()
-            else:
-                arg_name = arg.strip()
+            # Split on '=' first so that a colon in the default value is not
+            # taken for a type annotation, e.g. def foo(arg1=":")
+            arg_head, equal, arg_value = arg.partition('=')
+            arg_name, colon, arg_type = arg_head.partition(':')
+
+            arg_name = arg_name.strip()
+            arg_type = arg_type.strip() if colon else None
+            arg_value = arg_value.strip() if equal else None
+
+            args.append((arg_name, arg_type, arg_value))
 
-            self.arg_name_list.append(arg_name)
-            self.arg_type_list.append(arg_type)
-            self.arg_value_list.append(arg_value)
+        self.args = tuple(args)
 
     def split_args_text_to_list(self, args_text):
         """Split the text including multiple arguments to list.
@@ -709,59 +731,56 @@ class FunctionInfo(object):
         brackets ans quotes.
         """
         args_list = []
-        idx_find_start = 0
         idx_arg_start = 0
+        closing_stack = []
+        quote = None
+        brackets = {'(': ')', '[': ']', '{': '}'}
 
-        try:
-            pos_quote = self._find_quote_position(args_text)
-            pos_round = self._find_bracket_position(args_text, '(', ')',
-                                                    pos_quote)
-            pos_curly = self._find_bracket_position(args_text, '{', '}',
-                                                    pos_quote)
-            pos_square = self._find_bracket_position(args_text, '[', ']',
-                                                     pos_quote)
-        except IndexError:
-            return None
-
-        while True:
-            pos_comma = args_text.find(',', idx_find_start)
-
-            if pos_comma == -1:
-                break
-
-            idx_find_start = pos_comma + 1
-
-            if self.is_char_in_pairs(pos_comma, pos_round) or \
-                    self.is_char_in_pairs(pos_comma, pos_curly) or \
-                    self.is_char_in_pairs(pos_comma, pos_square) or \
-                    self.is_char_in_pairs(pos_comma, pos_quote):
-                continue
+        for idx, character in enumerate(args_text):
+            if quote is not None:
+                if character == quote and args_text[idx - 1] != '\\':
+                    quote = None
+            elif character == "'" or character == '"':
+                quote = character
+            elif character in brackets:
+                closing_stack.append(brackets[character])
+            elif character in ')]}':
+                if not closing_stack or closing_stack.pop() != character:
+                    return None
+            elif character == ',' and not closing_stack:
+                args_list.append(args_text[idx_arg_start:idx])
+                idx_arg_start = idx + 1
 
-            args_list.append(args_text[idx_arg_start:pos_comma])
-            idx_arg_start = pos_comma + 1
+        if closing_stack or quote is not None:
+            return None
 
         if idx_arg_start < len(args_text):
             args_list.append(args_text[idx_arg_start:])
 
         return args_list
 
+    @classmethod
+    def from_text(cls, text):
+        """Return a new instance with the parsed function definition text."""
+        func_info = cls()
+        func_info.parse_def(text)
+
+        return func_info
+
     def parse_def(self, text):
         """Parse the function definition text."""
-        self.__init__()
-
         if not is_start_of_function(text):
             return
 
         self.func_indent = get_indent(text)
 
         text = text.strip()
-        text = text.replace('\r\n', '')
-        text = text.replace('\n', '')
+        text = text.translate(NEWLINE_TABLE)
 
-        return_type_re = re.search(r'->[ ]*([a-zA-Z0-9_,()\[\] ]*):$', text)
-        if return_type_re:
-            self.return_type_annotated = return_type_re.group(1)
-            text_end = text.rfind(return_type_re.group(0))
+        pos_arrow = self._find_return_arrow_position(text)
+        if pos_arrow > -1:
+            self.return_type_annotated = text[pos_arrow + 2:-1].strip()
+            text_end = pos_arrow
         else:
             self.return_type_annotated = None
             text_end = len(text)
@@ -792,6 +811,7 @@ class FunctionInfo(object):
 
         # get return value
         pattern_return = r'return |yield '
+        return_value_in_body = []
         line_list = text.split('\n')
         is_found_return = False
         line_return_tmp = ''
@@ -809,25 +829,29 @@ class FunctionInfo(object):
                 try:
                     pos_quote = self._find_quote_position(line_return_tmp)
 
-                    if line_return_tmp[-1] == '\\':
+                    if line_return_tmp.endswith('\\'):
                         line_return_tmp = line_return_tmp[:-1]
                         continue
 
+                    quote_mask = self._get_quote_mask(line_return_tmp,
+                                                      pos_quote)
                     self._find_bracket_position(line_return_tmp, '(', ')',
-                                                pos_quote)
+                                                quote_mask)
                     self._find_bracket_position(line_return_tmp, '{', '}',
-                                                pos_quote)
+                                                quote_mask)
                     self._find_bracket_position(line_return_tmp, '[', ']',
-                                                pos_quote)
+                                                quote_mask)
                 except IndexError:
                     continue
 
                 return_value = re.sub(pattern_return, '', line_return_tmp)
-                self.return_value_in_body.append(return_value)
+                return_value_in_body.append(return_value)
 
                 is_found_return = False
                 line_return_tmp = ''
 
+        self.return_value_in_body = return_value_in_body
+
 
 class QMenuOnlyForEnter(QMenu):
     """The class executes the selected action when "enter key" is input.
@@ -15,7 +15,8 @@ from qtpy.QtGui import QTextCursor
 from spyder.config.manager import CONF
 from spyder.utils.qthelpers import qapplication
 from spyder.plugins.editor.widgets.codeeditor import CodeEditor
-from spyder.plugins.editor.extensions.docstring import FunctionInfo
+from spyder.plugins.editor.extensions.docstring import (
+    FunctionInfo, is_start_of_function, parse_function_definition)
 
 
 # =============================================================================
@@ -37,6 +38,21 @@ def editor_auto_docstring():
 # =============================================================================
 # ---- Tests
 # =============================================================================
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('def foo():', True),
+        ('def\tfoo():', True),
+        ('    async def foo():', True),
+        ('default = 1', False),
+        ('class Foo:', False),
+        (None, False),
+    ])
+def test_is_start_of_function(text, expected):
+    """Test the detection of the first line of a function definition."""
+    assert is_start_of_function(text) == expected
+
+
 @pytest.mark.parametrize(
     "text, indent, name_list, type_list, value_list, rtype",
     [
@@ -45,13 +61,22 @@ def editor_auto_docstring():
              (float, int): """,
          ' ', ['arg0', 'arg1', 'arg2'], [None, None, 'str'],
          [None, "':'", "'-> (float, str):'"],
-         '(float, int)')
+         '(float, int)'),
+        ("def foo(arg0: int=')') -> Dict[str, np.ndarray]:",
+         '', ['arg0'], ['int'], ["')'"], 'Dict[str, np.ndarray]'),
+        ('def foo(arg0=(]):', '', [], [], [], None),
+        ("def foo(arg0='->x', arg1='('):",
+         '', ['arg0', 'arg1'], [None, None], ["'->x'", "'('"], None),
+        ('def foo() -> "a->b":', '', [], [], [], '"a->b"'),
+        ('def foo({}):'.format(', '.join(
+            'arg{0}=({0}, "{0}")'.format(i) for i in range(30))),
+         '', ['arg{}'.format(i) for i in range(30)], [None] * 30,
+         ['({0}, "{0}")'.format(i) for i in range(30)], None)
     ])
 def test_parse_function_definition(text, indent, name_list, type_list,
                                    value_list, rtype):
     """Test the parse_def method of FunctionInfo class."""
-    func_info = FunctionInfo()
-    func_info.parse_def(text)
+    func_info = FunctionInfo.from_text(text)
 
     assert func_info.func_indent == indent
     assert func_info.arg_name_list == name_list
@@ -95,6 +120,29 @@ def test_get_function_body(editor_auto_docstring, text, indent, expected):
     assert expected == result
 
 
+def test_generate_docstring_keeps_cached_definition(editor_auto_docstring):
+    """Test that generating a docstring doesn't modify the cached parse."""
+    editor = editor_auto_docstring
+    editor.set_text('def foo(self, arg):\n    """\n    return arg')
+
+    cursor = editor.textCursor()
+    cursor.setPosition(0, QTextCursor.MoveAnchor)
+    cursor.movePosition(QTextCursor.NextBlock)
+    cursor.movePosition(QTextCursor.EndOfLine)
+    editor.setTextCursor(cursor)
+
+    writer = editor.writer_docstring
+    first = writer._generate_docstring('Numpydoc', '"')
+    second = writer._generate_docstring('Numpydoc', '"')
+
+    assert first == second
+    assert 'arg : TYPE' in first
+
+    func_info = parse_function_definition('def foo(self, arg):')
+    assert func_info.arg_name_list == ['self', 'arg']
+    assert func_info.return_value_in_body == []
+
+
 @pytest.mark.parametrize("use_shortcut", [True, False])
 @pytest.mark.parametrize(
     "doc_type, text, expected",